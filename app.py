@@ -6,15 +6,16 @@ load_dotenv() # Load environment variables from .env file
 
 import streamlit as st
 from datetime import date, datetime
-import time
 
 from logic import (
+    SUMMARY_SECTIONS,
     compute_periods,
     decade_label,
-    generate_summary,
+    generate_summary_stream,
     get_generation,
     get_star_sign,
     parse_birthdate,
+    share_id,
 )
 
 # Apply custom styles
@@ -28,8 +29,10 @@ st.set_page_config(
     }
 )
 
-# Set dark theme
-st.markdown("""
+# Static page chrome. Streamlit drops any element a rerun does not emit
+# again, so the styles cannot be injected only once per session; instead
+# the CSS and header go out together as a single element.
+_CSS = """
 <style>
     .main-header {text-align: center; margin-bottom: 1rem;}
     .stButton button {width: 100%}
@@ -37,9 +40,11 @@ st.markdown("""
     .results-section {margin-top: 2rem; padding: 1rem; border-radius: 5px;}
     .stDateInput > div > div > input {max-width: 100%;}
 </style>
-""", unsafe_allow_html=True)
+"""
+_HEADER = "<h1 class='main-header'>📅 Age & Era Calculator</h1>"
+_PAGE_CHROME = _CSS + _HEADER
 
-st.markdown("<h1 class='main-header'>📅 Age & Era Calculator</h1>", unsafe_allow_html=True)
+st.markdown(_PAGE_CHROME, unsafe_allow_html=True)
 
 # Initialize session state for input type if not exists
 if 'input_type' not in st.session_state:
@@ -78,7 +83,87 @@ with st.form("input_form"):
     country = st.text_input("Country of upbringing (optional)")
     submitted = st.form_submit_button("Calculate")
 
+# The last successful submission and its finished summary are kept in
+# session state. Reruns triggered by unrelated widgets redraw the results from
+# there; only a new submission asks the model for anything.
+def show_results(birth: date, country: str, summary: dict[str, str] | None = None) -> dict[str, str]:
+    """Render the results for *birth*, streaming the summary if none is given.
+
+    Returns the summary shown, so it can be stored for later reruns.
+    """
+    child_start, child_end, teen_start, teen_end, ya_start, ya_end = compute_periods(birth)
+
+    st.subheader("Results")
+
+    st.markdown(
+        f"**Childhood years:** {child_start} – {child_end} "
+        f"({decade_label(child_start)})"
+    )
+    st.markdown(
+        f"**Teenage years:** {teen_start} – {teen_end} "
+        f"({decade_label(teen_start)})"
+    )
+    st.markdown(
+        f"**Young adult years:** {ya_start} – {ya_end} "
+        f"({decade_label(ya_start)})"
+    )
+    st.markdown(f"**Star sign:** {get_star_sign(birth)}")
+    st.markdown(f"**Generation:** {get_generation(birth.year)}")
+
+    # LLM summary (optional). Each section appears in its own slot as soon as
+    # it is ready; only the first to arrive starts expanded.
+    st.markdown("---")
+    st.subheader("Cultural Snapshot")
+    years = {
+        "childhood": (child_start, child_end),
+        "teen": (teen_start, teen_end),
+        "young_adult": (ya_start, ya_end),
+    }
+    titles = dict(SUMMARY_SECTIONS)
+    slots = {section: st.empty() for section, _ in SUMMARY_SECTIONS}
+    message_slot = st.empty()
+
+    def show(section: str, text: str, expanded: bool) -> None:
+        if section == "message":
+            message_slot.markdown(text)
+            return
+        start, end = years[section]
+        with slots[section].container():
+            with st.expander(f"{titles[section]} ({start}-{end})", expanded=expanded):
+                st.markdown(text)
+
+    if summary is None:
+        summary = {}
+        with st.spinner("Generating cultural summary..."):
+            for section, text in generate_summary_stream(
+                teen_start=teen_start,
+                teen_end=teen_end,
+                ya_start=ya_start,
+                ya_end=ya_end,
+                country=country or "their country",
+                # Include childhood years in the prompt as well
+                child_start=child_start,
+                child_end=child_end,
+            ):
+                show(section, text, expanded=not summary)
+                summary[section] = text
+    else:
+        for shown, (section, text) in enumerate(summary.items()):
+            show(section, text, expanded=shown == 0)
+
+    # Shareable link
+    st.markdown("---")
+    st.subheader("Share this link")
+    # Same birthdate and country always give the same ID
+    share_placeholder = f"unique-id-{share_id(birth, country)}"
+    st.text_input("Share ID", value=share_placeholder, disabled=True)
+    return summary
+
+
 if submitted:
+    # Drop the old results first, so a submission interrupted by another
+    # rerun does not leave them on screen for the wrong birthdate.
+    st.session_state.pop("results", None)
     try:
         if st.session_state.input_type == "Date of Birth":
             birth = parse_birthdate(dob=dob_input)
@@ -87,52 +172,7 @@ if submitted:
     except ValueError as exc:
         st.error(str(exc))
     else:
-        child_start, child_end, teen_start, teen_end, ya_start, ya_end = compute_periods(birth)
-
-        st.subheader("Results")
-
-        st.markdown(
-            f"**Childhood years:** {child_start.year} – {child_end.year} "
-            f"({decade_label(child_start.year)})"
-        )
-        st.markdown(
-            f"**Teenage years:** {teen_start.year} – {teen_end.year} "
-            f"({decade_label(teen_start.year)})"
-        )
-        st.markdown(
-            f"**Young adult years:** {ya_start.year} – {ya_end.year} "
-            f"({decade_label(ya_start.year)})"
-        )
-        st.markdown(f"**Star sign:** {get_star_sign(birth)}")
-        st.markdown(f"**Generation:** {get_generation(birth.year)}")
-
-        # LLM summary (optional)
-        with st.spinner("Generating cultural summary..."):
-            summary = generate_summary(
-                teen_start=teen_start.year,
-                teen_end=teen_end.year,
-                ya_start=ya_start.year,
-                ya_end=ya_end.year,
-                country=country or "their country",
-                # Include childhood years in the prompt as well
-                child_start=child_start.year,
-                child_end=child_end.year,
-            )
-        st.markdown("---")
-        st.subheader("Cultural Snapshot")
-        st.markdown(summary)
-
-        # Shareable link
-        params = {
-            "dob": birth.isoformat(),
-            "country": country,
-        }
-        # Create shareable link
-        st.markdown("---")
-        st.subheader("Share this link")
-        timestamp = int(time.time())
-        shareable_id = f"{birth.year}-{birth.month}-{birth.day}-{timestamp}"
-        
-        # Avoid using the deprecated experimental_get_query_params
-        share_placeholder = f"unique-id-{shareable_id}"
-        st.text_input("Share ID", value=share_placeholder, disabled=True)
+        summary = show_results(birth, country)
+        st.session_state.results = (birth, country, summary)
+elif "results" in st.session_state:
+    show_results(*st.session_state.results)
@@ -2,15 +2,34 @@
 """
 from __future__ import annotations
 
+import argparse
+import asyncio
+import csv
+import functools
+import hashlib
+import json
 import os
-from datetime import date, datetime
-from typing import Tuple
+import sqlite3
+import string
+import threading
+import time
+import weakref
+from bisect import bisect_right
+from calendar import isleap
+from collections import OrderedDict
+from datetime import date
+from typing import Iterator, NamedTuple, Sequence, Tuple
 
 try:
-    from openai import OpenAI # type: ignore
+    import numpy as np # type: ignore
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    from openai import AsyncOpenAI, OpenAI # type: ignore
 except ImportError:  # pragma: no cover
     OpenAI = None  # Placeholder so type checkers do not complain
-    openai = None # for older references, will be cleaned up
+    AsyncOpenAI = None
 
 # ---------------------------------------------------------------------------
 # Pure calculations (no external services)
@@ -34,30 +53,42 @@ def parse_birthdate(*, age: int | None = None, dob: date | None = None) -> date:
         if not (0 < age < 130):
             raise ValueError("Age must be between 1 and 129.")
         today = date.today()
-        # Attempt to keep month/day; fallback for 29 Feb edge-case.
-        try:
-            birth = date(today.year - age, today.month, today.day)
-        except ValueError:  # 29 Feb when today is 29 Feb on non-leap year
-            birth = date(today.year - age, today.month, today.day - 1)
-        return birth
+        # Keep month/day; 29 Feb falls back to 28 Feb in a non-leap birth year.
+        y, m, d = today.year - age, today.month, today.day
+        if (m, d) == (2, 29) and not isleap(y):
+            d = 28
+        return date(y, m, d)
 
     raise ValueError("Please specify either age or date of birth.")
 
 
-def compute_periods(birth: date) -> Tuple[date, date, date, date, date, date]:
-    """Return (child_start, child_end, teen_start, teen_end, ya_start, ya_end).
+# Offsets, in years from birth, of the bounds returned by compute_periods.
+_PERIOD_OFFSETS = (5, 12, 13, 19, 20, 29)
+_PERIOD_FIELDS = ("child_start", "child_end", "teen_start", "teen_end", "ya_start", "ya_end")
+
+
+def compute_periods(birth: date) -> Tuple[int, int, int, int, int, int]:
+    """Return the years (child_start, child_end, teen_start, teen_end, ya_start, ya_end).
     
     Childhood years: 5-12
     Teenage years: 13-19
     Young adult years: 20-29
     """
-    child_start = birth.replace(year=birth.year + 5)
-    child_end = birth.replace(year=birth.year + 12)
-    teen_start = birth.replace(year=birth.year + 13)
-    teen_end = birth.replace(year=birth.year + 19)
-    ya_start = birth.replace(year=birth.year + 20)
-    ya_end = birth.replace(year=birth.year + 29)
-    return child_start, child_end, teen_start, teen_end, ya_start, ya_end
+    year = birth.year
+    return year + 5, year + 12, year + 13, year + 19, year + 20, year + 29
+
+
+def _shift_year(birth: date, years: int) -> date:
+    """Return *birth* moved by *years*; 29 Feb becomes 28 Feb in non-leap years."""
+    year = birth.year + years
+    if birth.month == 2 and birth.day == 29 and not isleap(year):
+        return date(year, 2, 28)
+    return birth.replace(year=year)
+
+
+def compute_period_dates(birth: date) -> Tuple[date, date, date, date, date, date]:
+    """Like :func:`compute_periods` but returning the birthday in each bound year."""
+    return tuple(_shift_year(birth, offset) for offset in _PERIOD_OFFSETS)
 
 
 def decade_label(year: int) -> str:
@@ -65,96 +96,628 @@ def decade_label(year: int) -> str:
     return f"{decade}s"
 
 
+# First birth year of each cohort; years before the first are "Unknown".
+_GEN_LOWER_BOUNDS = (1928, 1946, 1965, 1981, 1997, 2013)
+_GEN_LABELS = (
+    "Unknown",
+    "Silent Generation",
+    "Baby Boomer",
+    "Generation X",
+    "Millennial",
+    "Generation Z",
+    "Generation Alpha",
+)
+
+
 def get_generation(year: int) -> str:
     """Return a conventional Western generational label."""
-    if 1928 <= year <= 1945:
-        return "Silent Generation"
-    if 1946 <= year <= 1964:
-        return "Baby Boomer"
-    if 1965 <= year <= 1980:
-        return "Generation X"
-    if 1981 <= year <= 1996:
-        return "Millennial"
-    if 1997 <= year <= 2012:
-        return "Generation Z"
-    if year >= 2013:
-        return "Generation Alpha"
-    return "Unknown"
+    return _GEN_LABELS[bisect_right(_GEN_LOWER_BOUNDS, year)]
+
+
+# First (month, day) of each sign; anything before Aquarius is Capricorn.
+_SIGN_STARTS = (
+    (1, 20, "Aquarius"),
+    (2, 19, "Pisces"),
+    (3, 21, "Aries"),
+    (4, 20, "Taurus"),
+    (5, 21, "Gemini"),
+    (6, 21, "Cancer"),
+    (7, 23, "Leo"),
+    (8, 23, "Virgo"),
+    (9, 23, "Libra"),
+    (10, 23, "Scorpio"),
+    (11, 22, "Sagittarius"),
+    (12, 22, "Capricorn"),
+)
+
+# Day-of-year offset of each month in a leap year, so 29 Feb has its own slot.
+_MONTH_OFFSETS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+
+
+def _build_sign_table() -> Tuple[str, ...]:
+    table = []
+    for month, offset in enumerate(_MONTH_OFFSETS, start=1):
+        days = (_MONTH_OFFSETS[month] if month < 12 else 366) - offset
+        for day in range(1, days + 1):
+            sign = "Capricorn"
+            for start_month, start_day, name in _SIGN_STARTS:
+                if (month, day) >= (start_month, start_day):
+                    sign = name
+            table.append(sign)
+    return tuple(table)
+
+
+_SIGN_BY_DOY = _build_sign_table()
 
 
 def get_star_sign(birth: date) -> str:
     """Return the Western zodiac sign for *birth* date."""
-    m, d = birth.month, birth.day
-    if (m == 12 and d >= 22) or (m == 1 and d <= 19):
-        return "Capricorn"
-    if (m == 1 and d >= 20) or (m == 2 and d <= 18):
-        return "Aquarius"
-    if (m == 2 and d >= 19) or (m == 3 and d <= 20):
-        return "Pisces"
-    if (m == 3 and d >= 21) or (m == 4 and d <= 19):
-        return "Aries"
-    if (m == 4 and d >= 20) or (m == 5 and d <= 20):
-        return "Taurus"
-    if (m == 5 and d >= 21) or (m == 6 and d <= 20):
-        return "Gemini"
-    if (m == 6 and d >= 21) or (m == 7 and d <= 22):
-        return "Cancer"
-    if (m == 7 and d >= 23) or (m == 8 and d <= 22):
-        return "Leo"
-    if (m == 8 and d >= 23) or (m == 9 and d <= 22):
-        return "Virgo"
-    if (m == 9 and d >= 23) or (m == 10 and d <= 22):
-        return "Libra"
-    if (m == 10 and d >= 23) or (m == 11 and d <= 21):
-        return "Scorpio"
-    if (m == 11 and d >= 22) or (m == 12 and d <= 21):
-        return "Sagittarius"
-    return "Unknown"
+    return _SIGN_BY_DOY[_MONTH_OFFSETS[birth.month - 1] + birth.day - 1]
+
+
+def share_id(birth: date, country: str) -> str:
+    """Return a short, stable ID for a (birthdate, country) submission.
+
+    The country is normalised the same way as the summary cache key.
+    """
+    payload = f"{birth.isoformat()}|{country.strip().lower()}".encode()
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Batch (vectorised) calculations, for many birthdates at once
+# ---------------------------------------------------------------------------
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("numpy is required for batch calculations.")
+
+
+def _as_days(births) -> "np.ndarray":
+    return np.asarray(births, dtype="datetime64[D]")
+
+
+def birth_years_vec(births) -> "np.ndarray":
+    """Return the calendar year of each date in *births* as ``int64``."""
+    _require_numpy()
+    return _as_days(births).astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def compute_periods_vec(births) -> "np.ndarray":
+    """Vectorised :func:`compute_periods` over an array of birthdates.
+
+    Returns an ``(N, 6)`` integer array of years, one row per birthdate, in
+    the order (child_start, child_end, teen_start, teen_end, ya_start, ya_end).
+    A single date is treated as a batch of one.
+    """
+    years = np.atleast_1d(birth_years_vec(births))
+    return years[:, np.newaxis] + np.asarray(_PERIOD_OFFSETS, dtype=np.int64)
+
+
+def decade_label_vec(years) -> "np.ndarray":
+    """Vectorised :func:`decade_label`."""
+    _require_numpy()
+    decades = (np.asarray(years, dtype=np.int64) // 10) * 10
+    return np.char.add(decades.astype(str), "s")
+
+
+def get_generation_vec(years) -> "np.ndarray":
+    """Vectorised :func:`get_generation`."""
+    _require_numpy()
+    idx = np.searchsorted(_GEN_LOWER_BOUNDS, np.asarray(years, dtype=np.int64), side="right")
+    return np.asarray(_GEN_LABELS)[idx]
+
+
+def get_star_sign_vec(births) -> "np.ndarray":
+    """Vectorised :func:`get_star_sign` over an array of birthdates."""
+    _require_numpy()
+    days = _as_days(births)
+    month_start = days.astype("datetime64[M]")
+    months = month_start.astype(np.int64) % 12
+    day_of_month = (days - month_start).astype(np.int64)
+    # Leap-year offsets give 29 Feb its own slot, so no special case is needed.
+    idx = np.asarray(_MONTH_OFFSETS, dtype=np.int64)[months] + day_of_month
+    return np.asarray(_SIGN_BY_DOY)[idx]
 
 # ---------------------------------------------------------------------------
 # LLM integration (optional)
 # ---------------------------------------------------------------------------
 
+# Summary sections in display order: (key used in the JSON reply, heading).
+SUMMARY_SECTIONS = (
+    ("childhood", "Childhood"),
+    ("teen", "Teenage Years"),
+    ("young_adult", "Young Adult Years"),
+)
+
+# Static instructions, identical on every request, so providers that cache
+# prompt prefixes can reuse them; only the user message varies per request.
 _SYSTEM_PROMPT = (
-    "You are a cultural historian. For an individual from {country}, provide a personalized cultural summary for the following periods: childhood ({child_start}-{child_end}), teenage years ({teen_start}-{teen_end}), and young adult years ({ya_start}-{ya_end}).\n\n"
-    "Present the information using Markdown. Do NOT add any overall title or introduction before the 'Childhood' section. Use the following structure EXACTLY:\n\n"
-    "Childhood ({child_start}-{child_end})\n"
-    "- **Event/Trend Title 1:** [Brief, personalized description of its relevance to a child of that age in {country} (also consider wider UK influences like popular music, TV, or national events where significant) during those years. Maximum 2-3 sentences.]\n"
-    "- **Event/Trend Title 2:** [Brief, personalized description as above... Maximum 2-3 sentences.]\n"
-    # (Include 3-4 items for this period following the same format)
-    "\n"
-    "Teenage Years ({teen_start}-{teen_end})\n"
-    "- **Event/Trend Title 1:** [Brief, personalized description of its relevance to a teenager of that age in {country} (also consider wider UK influences like popular music, TV, or national events where significant) during those years. Maximum 2-3 sentences.]\n"
-    "- **Event/Trend Title 2:** [Brief, personalized description as above... Maximum 2-3 sentences.]\n"
-    # (Include 3-4 items for this period following the same format)
-    "\n"
-    "Young Adult Years ({ya_start}-{ya_end})\n"
-    "- **Event/Trend Title 1:** [Brief, personalized description of its relevance to a young adult of that age in {country} (also consider wider UK influences like popular music, TV, or national events where significant) during those years. Maximum 2-3 sentences.]\n"
-    "- **Event/Trend Title 2:** [Brief, personalized description as above... Maximum 2-3 sentences.]\n"
-    # (Include 3-4 items for this period following the same format)
-    "\n"
-    "Ensure you provide 3 to 4 bullet-pointed items for each of the three periods.\n"
-    "The descriptions for each item MUST be very concise (2-3 sentences maximum) and focus on the personal impact and experience for someone of that specific age primarily in {country}, while acknowledging significant broader UK cultural influences where applicable (e.g., music, national media, major political shifts).\n"
+    "You are a cultural historian. The user gives the country someone grew up in and one or more periods of their life, "
+    "one per line as 'key: start-end'. The key is 'childhood' (a child), 'teen' (a teenager) or 'young_adult' (a young adult). "
+    "Provide a personalized cultural summary for each requested period.\n\n"
+    "Reply with a compact JSON object that has exactly one property per requested period, named by its key, in the order the periods were given. "
+    "Each value is a list of exactly 3 objects with two string properties:\n"
+    "- \"title\": a short event or trend title.\n"
+    "- \"description\": a brief, personalized description of its relevance to someone of that age in the user's country "
+    "(also consider wider UK influences like popular music, TV, or national events where significant) during those years.\n\n"
+    "The descriptions for each item MUST be very concise (1-2 sentences, under 30 words) and focus on the personal impact and experience for someone of that specific age primarily in the user's country, while acknowledging significant broader UK cultural influences where applicable (e.g., music, national media, major political shifts).\n"
     "The tone should be engaging."
 )
 
+_USER_COUNTRY = "Country: {country}"
+_USER_SECTION = "{section}: {start}-{end}"
 
-def generate_summary(*, child_start: int, child_end: int, teen_start: int, teen_end: int, ya_start: int, ya_end: int, country: str) -> str:
-    """Return a cultural-influences summary via LLM.
 
-    If the ``openai`` package or API key is unavailable, a placeholder string
-    is returned instead of raising.
+def _compile_template(template: str) -> Tuple[Tuple[str, str | None], ...]:
+    """Split *template* once into (literal, field) pairs.
+
+    Rendering is then a join over pre-parsed chunks instead of re-scanning the
+    template on every call.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if OpenAI is None or not api_key:
-        return (
-            "(OpenAI API key not configured or library not found, so here is a placeholder.)\n"
-            "Imagine descriptions of pop culture, music scenes, and societal "
-            "changes spanning the requested years here."
-        )
+    return tuple((literal, field) for literal, field, _, _ in string.Formatter().parse(template))
+
+
+_USER_COUNTRY_PARTS = _compile_template(_USER_COUNTRY)
+_USER_SECTION_PARTS = _compile_template(_USER_SECTION)
+
+
+def _render(parts: Tuple[Tuple[str, str | None], ...], fields: dict[str, object]) -> str:
+    out: list[str] = []
+    for literal, field in parts:
+        out.append(literal)
+        if field is not None:
+            out.append(str(fields[field]))
+    return "".join(out)
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+# Every request gets the full cap, however many sections it asks for. A
+# full-length section (three ~30-word items as JSON) needs about 180 tokens,
+# so a retry for the sections a cut-off reply missed always has room.
+_MAX_TOKENS = 450
+
+
+class SummaryParams(NamedTuple):
+    """Keyword arguments of :func:`generate_summary`, as one hashable record."""
+
+    child_start: int
+    child_end: int
+    teen_start: int
+    teen_end: int
+    ya_start: int
+    ya_end: int
+    country: str
+    model: str = DEFAULT_MODEL
+
+    def section_years(self) -> dict[str, Tuple[int, int]]:
+        return {
+            "childhood": (self.child_start, self.child_end),
+            "teen": (self.teen_start, self.teen_end),
+            "young_adult": (self.ya_start, self.ya_end),
+        }
+
+
+_SUMMARY_CACHE_SIZE = 1024
+_SUMMARY_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_SUMMARY_CACHE_LOCK = threading.Lock()
+
+# (model, normalised country, section, start year, end year)
+SectionKey = Tuple[str, str, str, int, int]
+
+
+def _section_keys(params: SummaryParams) -> dict[str, SectionKey]:
+    """Return the cache key of each section of a summary request.
+
+    Sections are cached independently, so requests sharing a country and a
+    period reuse that section. The country is normalised so that "UK", " uk"
+    and "uk " share one entry.
+    """
+    country = params.country.strip().lower()
+    return {
+        section: (params.model, country, section, start, end)
+        for section, (start, end) in params.section_years().items()
+    }
+
+
+# Second cache tier on disk, so summaries survive restarts and redeploys.
+# Set SUMMARY_CACHE_PATH to an empty string to disable it.
+_DISK_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", ".summary_cache.sqlite3")
+_DISK_CACHE_TTL = 30 * 24 * 60 * 60  # seconds; lets prompt tweaks propagate
+# Entries written under a different prompt or token cap are never served.
+_PROMPT_FINGERPRINT = hashlib.blake2b(
+    f"{_SYSTEM_PROMPT}|{_USER_COUNTRY}|{_USER_SECTION}|{_MAX_TOKENS}".encode(), digest_size=4
+).hexdigest()
+_disk_cache: sqlite3.Connection | None = None
+_disk_cache_failed = False
+
+
+def _get_disk_cache() -> sqlite3.Connection | None:
+    """Return the open disk cache, or ``None`` if disabled or unusable.
+
+    Expired entries and those written under another prompt fingerprint are
+    deleted on connect, so the file does not grow without bound. Must be
+    called with ``_SUMMARY_CACHE_LOCK`` held.
+    """
+    global _disk_cache, _disk_cache_failed
+    if _disk_cache is None and _DISK_CACHE_PATH and not _disk_cache_failed:
+        try:
+            conn = sqlite3.connect(_DISK_CACHE_PATH, check_same_thread=False)
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS summaries "
+                    "(key TEXT PRIMARY KEY, summary TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                conn.execute(
+                    "DELETE FROM summaries WHERE created <= ? OR key NOT LIKE ?",
+                    (time.time() - _DISK_CACHE_TTL, f"{_PROMPT_FINGERPRINT}|%"),
+                )
+            _disk_cache = conn
+        except sqlite3.Error:
+            _disk_cache_failed = True
+    return _disk_cache
+
+
+def _disk_key(key: SectionKey) -> str:
+    return "|".join(map(str, (_PROMPT_FINGERPRINT, *key)))
+
+
+def _cache_get(key: SectionKey) -> str | None:
+    with _SUMMARY_CACHE_LOCK:
+        summary = _SUMMARY_CACHE.get(key)
+        if summary is not None:
+            _SUMMARY_CACHE.move_to_end(key)
+            return summary
+
+        conn = _get_disk_cache()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT summary FROM summaries WHERE key = ? AND created > ?",
+                (_disk_key(key), time.time() - _DISK_CACHE_TTL),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+    if row is None:
+        return None
+    _cache_put(key, row[0], persist=False)
+    return row[0]
+
+
+def _cache_put(key: SectionKey, summary: str, *, persist: bool = True) -> None:
+    with _SUMMARY_CACHE_LOCK:
+        _SUMMARY_CACHE[key] = summary
+        _SUMMARY_CACHE.move_to_end(key)
+        while len(_SUMMARY_CACHE) > _SUMMARY_CACHE_SIZE:
+            _SUMMARY_CACHE.popitem(last=False)
+
+        conn = _get_disk_cache() if persist else None
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, created) VALUES (?, ?, ?)",
+                    (_disk_key(key), summary, time.time()),
+                )
+        except sqlite3.Error:
+            pass
+
+
+_PLACEHOLDER = (
+    "(OpenAI API key not configured or library not found, so here is a placeholder.)\n"
+    "Imagine descriptions of pop culture, music scenes, and societal "
+    "changes spanning the requested years here."
+)
+
+# Periods outside these bounds get a canned message instead of an API call:
+# the model has little reliable to say about them.
+_EARLIEST_SUMMARY_YEAR = 1900
+_MAX_FUTURE_YEARS = 5
+
+
+def _out_of_range_sections(params: SummaryParams) -> dict[str, str]:
+    """Return a note for each section of *params* not worth a summary.
+
+    Sections are judged on their own years, so someone whose young adult
+    years lie ahead still gets their childhood and teenage years covered.
+    """
+    titles = dict(SUMMARY_SECTIONS)
+    latest = date.today().year + _MAX_FUTURE_YEARS
+    notes = {}
+    for section, (start, end) in params.section_years().items():
+        if start < _EARLIEST_SUMMARY_YEAR:
+            notes[section] = (
+                f"(No snapshot for {titles[section]} ({start}-{end}): it starts before "
+                f"{_EARLIEST_SUMMARY_YEAR}, too far back for a reliable summary.)"
+            )
+        elif end > latest:
+            notes[section] = (
+                f"(No snapshot yet for {titles[section]} ({start}-{end}): "
+                "too many of those years are still to come.)"
+            )
+    return notes
+
+
+_API_KEY: str | None = None
+_ENABLED = False
+_ASYNC_ENABLED = False
 
-    client = OpenAI(api_key=api_key)
-    prompt = _SYSTEM_PROMPT.format(
+
+def _load_api_key() -> None:
+    """Read ``OPENAI_API_KEY`` and set whether summaries can be generated.
+
+    Runs once at import (app.py loads .env before importing this module) and
+    again from the command line after it has loaded .env itself.
+    """
+    global _API_KEY, _ENABLED, _ASYNC_ENABLED
+    _API_KEY = os.getenv("OPENAI_API_KEY")
+    _ENABLED = bool(_API_KEY and OpenAI is not None)
+    _ASYNC_ENABLED = bool(_API_KEY and AsyncOpenAI is not None)
+    _get_client.cache_clear()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    """Return a shared client so its keep-alive connection pool is reused."""
+    return OpenAI(api_key=_API_KEY)
+
+
+_load_api_key()
+
+
+# AsyncOpenAI clients hold connections bound to the event loop that opened
+# them, so one client is kept per running loop rather than per process.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = _ASYNC_CLIENTS[loop] = AsyncOpenAI(api_key=_API_KEY)
+    return client
+
+
+def _completion_args(params: SummaryParams, sections: Sequence[str]) -> dict:
+    """Return ``chat.completions.create`` arguments requesting only *sections*."""
+    years = params.section_years()
+    # Only the cache key is normalised; the model sees the country as typed.
+    lines = [_render(_USER_COUNTRY_PARTS, {"country": params.country.strip()})]
+    for section in sections:
+        start, end = years[section]
+        lines.append(_render(_USER_SECTION_PARTS, {"section": section, "start": start, "end": end}))
+    return {
+        "model": params.model,
+        "messages": [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": "\n".join(lines)},
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.7,
+        "max_tokens": _MAX_TOKENS,
+        "stream": True,
+    }
+
+
+_TRUNCATED_MESSAGE = (
+    "(The cultural snapshot was cut short before it covered every period. "
+    "Submit again to fill in the rest.)"
+)
+_UNREADABLE_MESSAGE = (
+    "(Part of the cultural snapshot came back in an unexpected format. "
+    "Submit again to fill in the rest.)"
+)
+
+
+class _IncompleteReply(ValueError):
+    """The model's reply ended without every requested section.
+
+    The message is suitable to show to the user as is.
+    """
+
+
+class _SectionParser:
+    """Split a streamed JSON object into its top-level properties as they complete.
+
+    :meth:`feed` takes each text delta and returns the ``(name, value)`` pairs
+    whose value closed within it, so sections can be shown before the rest of
+    the reply has arrived.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+
+    def feed(self, delta: str) -> list[Tuple[str, object]]:
+        self._text += delta
+        done: list[Tuple[str, object]] = []
+        for i in range(self._pos, len(self._text)):
+            c = self._text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._start = i + 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    done.extend(self._member(self._text[self._start:i]))
+            elif c == "," and self._depth == 1:
+                done.extend(self._member(self._text[self._start:i]))
+                self._start = i + 1
+        self._pos = len(self._text)
+        return done
+
+    @staticmethod
+    def _member(text: str) -> list[Tuple[str, object]]:
+        if not text.strip():
+            return []
+        try:
+            return list(json.loads("{" + text + "}").items())
+        except ValueError:
+            raise _IncompleteReply(_UNREADABLE_MESSAGE) from None
+
+
+def _format_items(items: object) -> str:
+    """Turn a section's list of ``{title, description}`` items into Markdown."""
+    if not isinstance(items, list) or not items:
+        raise _IncompleteReply(_UNREADABLE_MESSAGE)
+    lines = []
+    for item in items:
+        if not isinstance(item, dict) or "title" not in item or "description" not in item:
+            raise _IncompleteReply(_UNREADABLE_MESSAGE)
+        lines.append(f"- **{item['title']}:** {item['description']}")
+    return "\n".join(lines)
+
+
+class _ReplyReader:
+    """Track one streamed reply: its finished sections and why it ended."""
+
+    def __init__(self, sections: Sequence[str]) -> None:
+        self._parser = _SectionParser()
+        self._wanted = set(sections)
+        self._finish_reason: str | None = None
+
+    def feed(self, chunk) -> list[Tuple[str, str]]:
+        """Return the ``(section, markdown)`` pairs completed by *chunk*."""
+        if not chunk.choices:
+            return []
+        choice = chunk.choices[0]
+        self._finish_reason = choice.finish_reason or self._finish_reason
+        if not choice.delta.content:
+            return []
+        completed = []
+        for name, items in self._parser.feed(choice.delta.content):
+            if name in self._wanted:
+                self._wanted.discard(name)
+                completed.append((name, _format_items(items)))
+        return completed
+
+    def close(self) -> None:
+        """Raise :class:`_IncompleteReply` if any requested section is missing."""
+        if self._finish_reason == "length":
+            raise _IncompleteReply(_TRUNCATED_MESSAGE)
+        if self._wanted:
+            raise _IncompleteReply(_UNREADABLE_MESSAGE)
+
+
+def _stream_sections(params: SummaryParams, sections: Sequence[str]) -> Iterator[Tuple[str, str]]:
+    """Yield ``(section, markdown)`` for *sections* as each one completes.
+
+    Sections finished before a failure are still yielded; API errors
+    propagate, and a reply that is cut off or malformed raises
+    :class:`_IncompleteReply` once the stream ends.
+    """
+    reader = _ReplyReader(sections)
+    for chunk in _get_client().chat.completions.create(**_completion_args(params, sections)):
+        yield from reader.feed(chunk)
+    reader.close()
+
+
+async def _collect_sections_async(params: SummaryParams, sections: Sequence[str], keys: dict[str, SectionKey], summary: dict[str, str]) -> None:
+    """Async :func:`_stream_sections`, caching each section into *summary*.
+
+    Sections are stored as they complete, so a later failure keeps them.
+    """
+    reader = _ReplyReader(sections)
+    async for chunk in await _get_async_client().chat.completions.create(**_completion_args(params, sections)):
+        for section, text in reader.feed(chunk):
+            _cache_put(keys[section], text)
+            summary[section] = text
+    reader.close()
+
+
+def _plan_sections(params: SummaryParams, enabled: bool) -> Tuple[dict[str, SectionKey], list[str]]:
+    """Return the cache keys of the sections to summarise, and notes on the rest.
+
+    Out-of-range sections are left out with a note each; if the API is not
+    *enabled*, every remaining section is replaced by the placeholder.
+    """
+    notes = _out_of_range_sections(params)
+    keys = {section: key for section, key in _section_keys(params).items() if section not in notes}
+    messages = list(notes.values())
+    if keys and not enabled:
+        messages.append(_PLACEHOLDER)
+        keys = {}
+    return keys, messages
+
+
+def _lookup_sections(keys: dict[str, SectionKey]) -> Tuple[dict[str, str], list[str]]:
+    """Return the cached sections and the names of those still missing."""
+    found: dict[str, str] = {}
+    missing: list[str] = []
+    for section, key in keys.items():
+        summary = _cache_get(key)
+        if summary is None:
+            missing.append(section)
+        else:
+            found[section] = summary
+    return found, missing
+
+
+def _finish(summary: dict[str, str], messages: Sequence[str]) -> dict[str, str]:
+    """Return *summary* in display order, with any *messages* under ``"message"``."""
+    ordered = {section: summary[section] for section, _ in SUMMARY_SECTIONS if section in summary}
+    if messages:
+        ordered["message"] = "\n\n".join(messages)
+    return ordered
+
+
+def generate_summary_stream(*, child_start: int, child_end: int, teen_start: int, teen_end: int, ya_start: int, ya_end: int, country: str, model: str = DEFAULT_MODEL) -> Iterator[Tuple[str, str]]:
+    """Yield ``(section, markdown)`` pairs as soon as each section is ready.
+
+    Cached sections come first, then the rest as the model finishes each one
+    in its streamed reply. If anything could not be generated, a final
+    ``("message", text)`` pair explains why, as in :func:`generate_summary`.
+    """
+    params = SummaryParams(child_start, child_end, teen_start, teen_end, ya_start, ya_end, country, model)
+    keys, messages = _plan_sections(params, _ENABLED)
+    summary, missing = _lookup_sections(keys)
+    yield from summary.items()
+    if missing:
+        try:
+            for section, text in _stream_sections(params, missing):
+                _cache_put(keys[section], text)
+                yield section, text
+        except _IncompleteReply as e:
+            messages.append(str(e))
+        except Exception as e:
+            messages.append(f"(Error communicating with OpenAI: {e})")
+    if messages:
+        yield "message", "\n\n".join(messages)
+
+
+def generate_summary(*, child_start: int, child_end: int, teen_start: int, teen_end: int, ya_start: int, ya_end: int, country: str, model: str = DEFAULT_MODEL) -> dict[str, str]:
+    """Return a cultural-influences summary via LLM, split into sections.
+
+    The result maps each key of :data:`SUMMARY_SECTIONS` to a Markdown bullet
+    list. Sections are memoised independently per (model, country, period) in
+    a process-wide LRU cache backed by a SQLite file, and only the missing
+    ones are requested from the API. Placeholders and error messages are never
+    cached.
+
+    Anything that could not be generated is explained under a ``"message"``
+    key instead of raising: a placeholder if the ``openai`` package or API key
+    is unavailable, a note for each period that starts before 1900 or ends
+    more than five years from now (the other periods are still summarised),
+    a note if the reply was cut short (any complete sections are kept), or
+    the API error.
+    """
+    summary = dict(generate_summary_stream(
         child_start=child_start,
         child_end=child_end,
         teen_start=teen_start,
@@ -162,15 +725,147 @@ def generate_summary(*, child_start: int, child_end: int, teen_start: int, teen_
         ya_start=ya_start,
         ya_end=ya_end,
         country=country,
-    )
+        model=model,
+    ))
+    message = summary.pop("message", None)
+    return _finish(summary, [message] if message else [])
+
+
+async def generate_summary_async(*, child_start: int, child_end: int, teen_start: int, teen_end: int, ya_start: int, ya_end: int, country: str, model: str = DEFAULT_MODEL) -> dict[str, str]:
+    """Asynchronous counterpart of :func:`generate_summary`.
+
+    Shares the same cache, so sync and async callers benefit from each
+    other's results.
+    """
+    return (await generate_summaries(
+        [SummaryParams(child_start, child_end, teen_start, teen_end, ya_start, ya_end, country, model)],
+        retries=1,
+    ))[0]
+
+
+async def generate_summaries(items: Sequence[SummaryParams], *, max_workers: int = 8, retries: int = 3, timeout: float = 60.0) -> list[dict[str, str]]:
+    """Generate summaries for many requests concurrently.
+
+    Duplicate requests are only sent once, at most *max_workers* API calls are
+    in flight at a time, and each call is retried up to *retries* times with
+    exponential backoff; a retry only asks for the sections still missing.
+    Results have the shape returned by :func:`generate_summary`, share its
+    cache and come back in the order of *items*.
+    """
+    if retries < 1:
+        raise ValueError("retries must be at least 1.")
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def one(params: SummaryParams) -> dict[str, str]:
+        keys, messages = _plan_sections(params, _ASYNC_ENABLED)
+        summary, missing = _lookup_sections(keys)
+        for attempt in range(retries if missing else 0):
+            try:
+                async with semaphore:
+                    await asyncio.wait_for(_collect_sections_async(params, missing, keys, summary), timeout)
+            except Exception as e:
+                missing = [section for section in missing if section not in summary]
+                if not missing:
+                    break
+                if attempt == retries - 1:
+                    if isinstance(e, _IncompleteReply):
+                        messages.append(str(e))
+                    elif isinstance(e, asyncio.TimeoutError):
+                        messages.append(f"(Timed out after {timeout:g}s waiting for OpenAI.)")
+                    else:
+                        messages.append(f"(Error communicating with OpenAI: {e})")
+                    break
+                await asyncio.sleep(2 ** attempt)
+            else:
+                break
+        return _finish(summary, messages)
+
+    def dedupe_key(item: SummaryParams) -> SummaryParams:
+        return item._replace(country=item.country.strip().lower())
+
+    # First request wins for each key, so the prompt keeps its original case.
+    unique = {}
+    for item in items:
+        unique.setdefault(dedupe_key(item), item)
+    results = dict(zip(unique, await asyncio.gather(*(one(params) for params in unique.values()))))
+    return [results[dedupe_key(item)] for item in items]
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def _batch(in_path: str, out_path: str, *, max_workers: int, model: str) -> None:
+    """Read birthdates from *in_path* and write periods and summaries to *out_path*.
+
+    Each input row needs a ``dob`` (YYYY-MM-DD) or an ``age`` column, and may
+    have a ``country``; all input columns are copied to the output, followed by
+    one ``summary_<section>`` column per section and ``summary_message``. Rows
+    that cannot be parsed are kept, with the reason in ``summary_message``.
+    """
+    with open(in_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    valid_rows = []
+    params = []
+    for row in rows:
+        try:
+            if row.get("dob"):
+                birth = parse_birthdate(dob=date.fromisoformat(row["dob"]))
+            elif row.get("age"):
+                birth = parse_birthdate(age=int(row["age"]))
+            else:
+                birth = parse_birthdate()
+        except ValueError as e:
+            row["summary_message"] = f"(Invalid row: {e})"
+            continue
+        periods = compute_periods(birth)
+        row.update(zip(_PERIOD_FIELDS, periods))
+        row["star_sign"] = get_star_sign(birth)
+        row["generation"] = get_generation(birth.year)
+        valid_rows.append(row)
+        params.append(SummaryParams(*periods, country=row.get("country") or "their country", model=model))
+
+    summaries = asyncio.run(generate_summaries(params, max_workers=max_workers))
+    for row, summary in zip(valid_rows, summaries):
+        for section, _ in SUMMARY_SECTIONS:
+            row[f"summary_{section}"] = summary.get(section, "")
+        row["summary_message"] = summary.get("message", "")
+
+    fieldnames = [key for key in dict.fromkeys(key for row in rows for key in row) if key != "summary_message"]
+    fieldnames.append("summary_message")
+    with open(out_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m logic", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch = commands.add_parser("batch", help="compute eras and summaries for a CSV of birthdates")
+    batch.add_argument("in_path", help="input CSV with dob or age, and optionally country")
+    batch.add_argument("out_path", help="output CSV")
+    batch.add_argument("--workers", type=int, default=8, help="maximum concurrent API calls")
+    batch.add_argument("--model", default=DEFAULT_MODEL, help="OpenAI chat model to use")
+    args = parser.parse_args(argv)
+    if args.command == "batch" and args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "system", "content": prompt}],
-            temperature=0.7,
-            max_tokens=600,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"(Error communicating with OpenAI: {e})"
+        from dotenv import load_dotenv # type: ignore
+    except ImportError:  # pragma: no cover
+        pass
+    else:
+        load_dotenv()
+        _load_api_key()
+
+    if args.command == "batch":
+        _batch(args.in_path, args.out_path, max_workers=args.workers, model=args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Numba-compiled batch kernels for Age & Era Calculator.
+
+Integer-only counterparts of :func:`logic.get_star_sign_vec` and
+:func:`logic.get_generation_vec`. Inputs are plain ``int64`` month/day/year
+arrays because Numba's nopython support for ``datetime64`` is limited.
+
+The kernels are compiled eagerly at import from explicit signatures and
+cached on disk (``cache=True``), so only the very first import on a machine
+pays the compile cost. Without Numba the same loops run as plain Python.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from logic import _GEN_LABELS, _GEN_LOWER_BOUNDS, _MONTH_OFFSETS, _SIGN_BY_DOY, _SIGN_STARTS
+
+try:
+    from numba import njit, prange # type: ignore
+except ImportError:  # pragma: no cover
+    njit = None
+    prange = range
+
+# Sign names in code order; ``_SIGN_CODES[doy]`` is an index into this tuple.
+SIGN_NAMES = tuple(name for _, _, name in _SIGN_STARTS)
+_SIGN_CODES = np.array([SIGN_NAMES.index(name) for name in _SIGN_BY_DOY], dtype=np.int8)
+_MONTH_OFFSETS_ARR = np.array(_MONTH_OFFSETS, dtype=np.int64)
+# Leap-year month lengths, so 29 Feb is a valid input.
+_MONTH_LENGTHS = np.diff(np.append(_MONTH_OFFSETS_ARR, 366))
+_GEN_BOUNDS_ARR = np.array(_GEN_LOWER_BOUNDS, dtype=np.int64)
+
+
+def _compile(signature: str):
+    if njit is None:
+        return lambda func: func
+    return njit(signature, parallel=True, cache=True)
+
+
+@_compile("void(int64[:], int64[:], int8[:])")
+def star_sign_codes(months, days, out):
+    """Write the sign code (index into ``SIGN_NAMES``) of each month/day to *out*."""
+    for i in prange(months.shape[0]):
+        out[i] = _SIGN_CODES[_MONTH_OFFSETS_ARR[months[i] - 1] + days[i] - 1]
+
+
+@_compile("void(int64[:], int8[:])")
+def generation_codes(years, out):
+    """Write the generation code (index into ``logic._GEN_LABELS``) of each year to *out*."""
+    for i in prange(years.shape[0]):
+        code = 0
+        for bound in _GEN_BOUNDS_ARR:
+            if years[i] >= bound:
+                code += 1
+        out[i] = code
+
+
+def star_signs(months, days) -> np.ndarray:
+    """Return the zodiac sign name for each (month, day) pair.
+
+    ``ValueError`` is raised for a month outside 1-12 or a day that does not
+    exist in its month (29 Feb is accepted). The kernel does no bounds
+    checking, so invalid input must never reach it.
+    """
+    months = np.ascontiguousarray(months, dtype=np.int64)
+    days = np.ascontiguousarray(days, dtype=np.int64)
+    if months.shape != days.shape:
+        raise ValueError("months and days must have the same shape.")
+    if np.any((months < 1) | (months > 12)):
+        raise ValueError("Months must be between 1 and 12.")
+    if np.any((days < 1) | (days > _MONTH_LENGTHS[months - 1])):
+        raise ValueError("Day is out of range for its month.")
+    out = np.empty(months.shape[0], dtype=np.int8)
+    star_sign_codes(months, days, out)
+    return np.asarray(SIGN_NAMES)[out]
+
+
+def generations(years) -> np.ndarray:
+    """Return the generational label for each birth year."""
+    years = np.ascontiguousarray(years, dtype=np.int64)
+    out = np.empty(years.shape[0], dtype=np.int8)
+    generation_codes(years, out)
+    return np.asarray(_GEN_LABELS)[out]
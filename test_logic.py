@@ -0,0 +1,390 @@
+"""Tests for logic.py (and the optional NumPy / Numba batch layers)."""
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+import types
+from datetime import date, timedelta
+
+import pytest
+
+import logic
+
+# Every day of a leap year and the following common year.
+ALL_DAYS = [date(2000, 1, 1) + timedelta(days=i) for i in range(366 + 365)]
+
+GENERATION_BOUNDARIES = {
+    1927: "Unknown",
+    1928: "Silent Generation",
+    1945: "Silent Generation",
+    1946: "Baby Boomer",
+    1964: "Baby Boomer",
+    1965: "Generation X",
+    1980: "Generation X",
+    1981: "Millennial",
+    1996: "Millennial",
+    1997: "Generation Z",
+    2012: "Generation Z",
+    2013: "Generation Alpha",
+}
+
+
+def _reference_star_sign(birth: date) -> str:
+    """The original branch cascade, kept as the oracle for the lookup table."""
+    m, d = birth.month, birth.day
+    if (m == 12 and d >= 22) or (m == 1 and d <= 19):
+        return "Capricorn"
+    if (m == 1 and d >= 20) or (m == 2 and d <= 18):
+        return "Aquarius"
+    if (m == 2 and d >= 19) or (m == 3 and d <= 20):
+        return "Pisces"
+    if (m == 3 and d >= 21) or (m == 4 and d <= 19):
+        return "Aries"
+    if (m == 4 and d >= 20) or (m == 5 and d <= 20):
+        return "Taurus"
+    if (m == 5 and d >= 21) or (m == 6 and d <= 20):
+        return "Gemini"
+    if (m == 6 and d >= 21) or (m == 7 and d <= 22):
+        return "Cancer"
+    if (m == 7 and d >= 23) or (m == 8 and d <= 22):
+        return "Leo"
+    if (m == 8 and d >= 23) or (m == 9 and d <= 22):
+        return "Virgo"
+    if (m == 9 and d >= 23) or (m == 10 and d <= 22):
+        return "Libra"
+    if (m == 10 and d >= 23) or (m == 11 and d <= 21):
+        return "Scorpio"
+    return "Sagittarius"
+
+
+# ---------------------------------------------------------------------------
+# Scalar helpers
+# ---------------------------------------------------------------------------
+
+class _LeapDay(date):
+    """``date`` whose ``today()`` is 29 Feb 2024."""
+
+    @classmethod
+    def today(cls):
+        return cls(2024, 2, 29)
+
+
+@pytest.mark.parametrize("age, expected", [
+    (1, date(2023, 2, 28)),
+    (4, date(2020, 2, 29)),
+    (30, date(1994, 2, 28)),
+    (24, date(2000, 2, 29)),
+])
+def test_parse_birthdate_from_age_on_29_feb(monkeypatch, age, expected):
+    monkeypatch.setattr(logic, "date", _LeapDay)
+    assert logic.parse_birthdate(age=age) == expected
+
+
+@pytest.mark.parametrize("year, label", sorted(GENERATION_BOUNDARIES.items()))
+def test_get_generation_boundaries(year, label):
+    assert logic.get_generation(year) == label
+
+
+def test_get_star_sign_matches_cascade_for_every_day():
+    for day in ALL_DAYS:
+        assert logic.get_star_sign(day) == _reference_star_sign(day), day
+
+
+def test_compute_periods_returns_years():
+    assert logic.compute_periods(date(1990, 6, 1)) == (1995, 2002, 2003, 2009, 2010, 2019)
+
+
+def test_compute_period_dates_handles_29_feb():
+    dates = logic.compute_period_dates(date(2000, 2, 29))
+    assert dates[0] == date(2005, 2, 28)
+    assert dates[1] == date(2012, 2, 29)
+
+
+def test_share_id_is_stable_and_normalises_country():
+    birth = date(1990, 1, 1)
+    assert logic.share_id(birth, " UK") == logic.share_id(birth, "uk")
+    assert logic.share_id(birth, "uk") != logic.share_id(birth, "fr")
+
+
+# ---------------------------------------------------------------------------
+# Batch (vectorised) helpers
+# ---------------------------------------------------------------------------
+
+def test_vectorised_helpers_match_scalar():
+    np = pytest.importorskip("numpy")
+    births = np.array([d.isoformat() for d in ALL_DAYS], dtype="datetime64[D]")
+    years = list(range(1900, 2031))
+
+    assert list(logic.get_star_sign_vec(births)) == [logic.get_star_sign(d) for d in ALL_DAYS]
+    assert list(logic.get_generation_vec(years)) == [logic.get_generation(y) for y in years]
+    assert list(logic.decade_label_vec(years)) == [logic.decade_label(y) for y in years]
+    assert [tuple(row) for row in logic.compute_periods_vec(births)] == [logic.compute_periods(d) for d in ALL_DAYS]
+
+
+def test_compute_periods_vec_accepts_a_single_date():
+    np = pytest.importorskip("numpy")
+    periods = logic.compute_periods_vec(np.datetime64("1990-06-01"))
+    assert periods.shape == (1, 6)
+    assert tuple(periods[0]) == logic.compute_periods(date(1990, 6, 1))
+
+
+def test_numba_kernels_match_scalar():
+    pytest.importorskip("numpy")
+    logic_numba = pytest.importorskip("logic_numba")
+    years = list(range(1900, 2031))
+
+    signs = logic_numba.star_signs([d.month for d in ALL_DAYS], [d.day for d in ALL_DAYS])
+    assert list(signs) == [logic.get_star_sign(d) for d in ALL_DAYS]
+    assert list(logic_numba.generations(years)) == [logic.get_generation(y) for y in years]
+
+
+@pytest.mark.parametrize("months, days", [([13], [1]), ([0], [1]), ([2], [30]), ([4], [31]), ([1], [0])])
+def test_numba_star_signs_rejects_invalid_dates(months, days):
+    pytest.importorskip("numpy")
+    logic_numba = pytest.importorskip("logic_numba")
+    with pytest.raises(ValueError):
+        logic_numba.star_signs(months, days)
+
+
+# ---------------------------------------------------------------------------
+# LLM integration, against a fake streaming client
+# ---------------------------------------------------------------------------
+
+PARAMS = logic.SummaryParams(1995, 2002, 2003, 2009, 2010, 2019, "United Kingdom")
+
+# Conservative estimate for JSON-heavy English text; real tokenisers average
+# closer to four characters per token, so the fake cuts replies off early.
+CHARS_PER_TOKEN = 3
+
+
+def _chunk(content=None, finish_reason=None):
+    delta = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+class FakeCompletions:
+    """Streams a JSON reply covering the requested sections in small pieces.
+
+    Each section has three items whose descriptions are *words* long. The
+    reply is cut off, with ``finish_reason="length"``, once it would exceed
+    the request's ``max_tokens`` (or at *truncate_at* characters if set).
+    """
+
+    def __init__(self, words=4, truncate_at=None):
+        self.words = words
+        self.truncate_at = truncate_at
+        self.calls = []
+
+    def _chunks(self, kwargs):
+        self.calls.append(kwargs)
+        lines = kwargs["messages"][1]["content"].splitlines()
+        sections = [line.split(":")[0] for line in lines[1:]]
+        description = " ".join(["Text, with {braces}."] + ["word"] * (self.words - 3))
+        text = json.dumps({
+            s: [{"title": f"{s} event or trend title", "description": description}] * 3
+            for s in sections
+        })
+        limit = kwargs["max_tokens"] * CHARS_PER_TOKEN
+        if self.truncate_at is not None:
+            limit = min(limit, self.truncate_at)
+        finish_reason = "stop"
+        if len(text) > limit:
+            text, finish_reason = text[:limit], "length"
+        chunks = [_chunk(text[i:i + 5]) for i in range(0, len(text), 5)]
+        return chunks + [_chunk(finish_reason=finish_reason)]
+
+    def create(self, **kwargs):
+        return iter(self._chunks(kwargs))
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        chunks = self._chunks(kwargs)
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        return stream()
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    completions = FakeCompletions()
+    async_completions = FakeAsyncCompletions()
+    monkeypatch.setattr(logic, "_ENABLED", True)
+    monkeypatch.setattr(logic, "_ASYNC_ENABLED", True)
+    monkeypatch.setattr(logic, "_DISK_CACHE_PATH", "")
+    monkeypatch.setattr(logic, "_SUMMARY_CACHE", logic.OrderedDict())
+    monkeypatch.setattr(logic, "_get_client", lambda: types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(logic, "_get_async_client", lambda: types.SimpleNamespace(chat=types.SimpleNamespace(completions=async_completions)))
+    return types.SimpleNamespace(sync=completions, async_=async_completions)
+
+
+def test_section_parser_emits_each_property_once_closed():
+    parser = logic._SectionParser()
+    assert parser.feed('{"childhood": [{"title": "a,}", "description": "b\\""}], "te') == [
+        ("childhood", [{"title": "a,}", "description": 'b"'}]),
+    ]
+    assert parser.feed('en": []') == []
+    assert parser.feed("}") == [("teen", [])]
+
+
+def test_generate_summary_returns_sections_and_caches_them(fake_api):
+    summary = logic.generate_summary(**PARAMS._asdict())
+    assert list(summary) == ["childhood", "teen", "young_adult"]
+    assert summary["childhood"].startswith("- **childhood event or trend title:** Text, with {braces}.")
+
+    request = fake_api.sync.calls[0]
+    assert request["stream"] is True
+    assert request["max_tokens"] == 450
+    assert request["messages"][1]["content"].startswith("Country: United Kingdom\n")
+
+    assert logic.generate_summary(**PARAMS._replace(country=" united kingdom")._asdict()) == summary
+    assert len(fake_api.sync.calls) == 1
+
+
+def test_truncated_reply_keeps_complete_sections(fake_api):
+    fake_api.sync.truncate_at = 300
+    summary = logic.generate_summary(**PARAMS._asdict())
+    assert "childhood" in summary and "young_adult" not in summary
+    assert summary["message"] == logic._TRUNCATED_MESSAGE
+
+    fake_api.sync.truncate_at = None
+    summary = logic.generate_summary(**PARAMS._asdict())
+    assert "message" not in summary
+    assert "childhood" not in fake_api.sync.calls[-1]["messages"][1]["content"]
+
+
+def test_out_of_range_sections_are_skipped_individually(fake_api):
+    summary = logic.generate_summary(**PARAMS._replace(ya_end=date.today().year + 20)._asdict())
+    assert list(summary) == ["childhood", "teen", "message"]
+    assert "Young Adult Years" in summary["message"]
+
+
+def test_full_length_section_fits_a_single_request(fake_api):
+    fake_api.sync.words = 30
+    params = PARAMS._replace(child_start=1850, ya_end=date.today().year + 20)
+    summary = logic.generate_summary(**params._asdict())
+
+    assert fake_api.sync.calls[0]["messages"][1]["content"].count("\n") == 1
+    assert summary["teen"].count("- **") == 3
+    assert logic._TRUNCATED_MESSAGE not in summary["message"]
+
+
+def test_resubmitting_fills_in_full_length_sections(fake_api):
+    fake_api.sync.words = 30
+    for _ in range(3):
+        summary = logic.generate_summary(**PARAMS._asdict())
+        if "message" not in summary:
+            break
+    assert list(summary) == ["childhood", "teen", "young_adult"]
+
+
+def test_generate_summaries_dedupes_and_keeps_order(fake_api):
+    items = [PARAMS, PARAMS._replace(country="united kingdom "), PARAMS._replace(country="France")]
+    results = asyncio.run(logic.generate_summaries(items))
+    assert results[0] == results[1]
+    assert list(results[2]) == ["childhood", "teen", "young_adult"]
+    assert len(fake_api.async_.calls) == 2
+
+
+@pytest.mark.parametrize("kwargs", [{"retries": 0}, {"max_workers": 0}])
+def test_generate_summaries_rejects_bad_limits(kwargs):
+    with pytest.raises(ValueError):
+        asyncio.run(logic.generate_summaries([PARAMS], **kwargs))
+
+
+def test_generate_summaries_reports_timeouts(fake_api, monkeypatch):
+    async def hang(*args):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(logic, "_collect_sections_async", hang)
+    [summary] = asyncio.run(logic.generate_summaries([PARAMS], retries=1, timeout=0.01))
+    assert summary == {"message": "(Timed out after 0.01s waiting for OpenAI.)"}
+
+
+def test_main_rejects_zero_workers(tmp_path):
+    with pytest.raises(SystemExit):
+        logic.main(["batch", str(tmp_path / "in.csv"), str(tmp_path / "out.csv"), "--workers", "0"])
+
+
+def test_batch_records_bad_rows_and_continues(fake_api, tmp_path):
+    in_path, out_path = tmp_path / "in.csv", tmp_path / "out.csv"
+    in_path.write_text("dob,age,country\nbad,,UK\n1990-06-01,,UK\n", encoding="utf-8")
+    logic._batch(str(in_path), str(out_path), max_workers=2, model=logic.DEFAULT_MODEL)
+
+    with open(out_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[0]["summary_message"].startswith("(Invalid row:")
+    assert rows[1]["child_start"] == "1995"
+    assert rows[1]["summary_childhood"]
+
+
+# ---------------------------------------------------------------------------
+# On-disk summary cache
+# ---------------------------------------------------------------------------
+
+KEY = ("gpt-3.5-turbo", "united kingdom", "childhood", 1995, 2002)
+
+
+@pytest.fixture
+def disk_cache(monkeypatch, tmp_path):
+    """Point the disk cache at a fresh database; yields a ``reopen`` helper."""
+    monkeypatch.setattr(logic, "_DISK_CACHE_PATH", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(logic, "_SUMMARY_CACHE", logic.OrderedDict())
+    monkeypatch.setattr(logic, "_disk_cache", None)
+    monkeypatch.setattr(logic, "_disk_cache_failed", False)
+
+    def reopen():
+        """Clear the memory LRU and reconnect, as a fresh process would."""
+        if logic._disk_cache is not None:
+            logic._disk_cache.close()
+        logic._disk_cache = None
+        logic._SUMMARY_CACHE.clear()
+
+    yield reopen
+    if logic._disk_cache is not None:
+        logic._disk_cache.close()
+
+
+def test_disk_cache_survives_clearing_memory(fake_api, disk_cache):
+    summary = logic.generate_summary(**PARAMS._asdict())
+    disk_cache()
+    assert logic.generate_summary(**PARAMS._asdict()) == summary
+    assert len(fake_api.sync.calls) == 1
+
+
+def test_disk_cache_entries_expire(monkeypatch, disk_cache):
+    logic._cache_put(KEY, "summary")
+    logic._SUMMARY_CACHE.clear()
+    monkeypatch.setattr(logic.time, "time", lambda: 1e12)
+    assert logic._cache_get(KEY) is None
+
+
+def test_disk_cache_ignores_other_prompt_fingerprints(monkeypatch, disk_cache):
+    logic._cache_put(KEY, "summary")
+    logic._SUMMARY_CACHE.clear()
+    monkeypatch.setattr(logic, "_PROMPT_FINGERPRINT", "00000000")
+    assert logic._cache_get(KEY) is None
+
+
+def test_disk_cache_prunes_stale_rows_on_connect(disk_cache):
+    logic._cache_put(KEY, "current")
+    with logic._disk_cache as conn:
+        conn.executemany("INSERT INTO summaries VALUES (?, ?, ?)", [
+            (logic._disk_key(KEY[:2] + ("teen", 2003, 2009)), "expired", 0.0),
+            ("00000000|" + "|".join(map(str, KEY)), "foreign", logic.time.time()),
+        ])
+
+    disk_cache()
+    rows = logic._get_disk_cache().execute("SELECT summary FROM summaries").fetchall()
+    assert rows == [("current",)]
+
+
+def test_unopenable_disk_cache_falls_back_to_memory(monkeypatch, tmp_path, disk_cache):
+    monkeypatch.setattr(logic, "_DISK_CACHE_PATH", str(tmp_path))  # a directory
+    logic._cache_put(KEY, "summary")
+    assert logic._disk_cache_failed
+    assert logic._cache_get(KEY) == "summary"